@@ -0,0 +1,41 @@
+"""
+Benchmark serial vs. pipelined download hashing against a local test server.
+$ python bench_download.py [size in MB] [rounds]
+"""
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+from time import sleep, time
+
+from hecksum.references import Reference
+
+size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+with tempfile.TemporaryDirectory() as directory:
+    with open(os.path.join(directory, 'artifact.bin'), 'wb') as f:
+        for _ in range(size_mb):
+            f.write(os.urandom(1024**2))
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'http.server', str(port), '--bind', '127.0.0.1', '--directory', directory],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        sleep(1)
+        ref = Reference(algorithm='sha256', extra_algorithms=['sha512'], download_url=f'http://127.0.0.1:{port}/artifact.bin')
+        for name, depth in (('serial', 0), ('pipelined', 4)):
+            timings = []
+            for _ in range(rounds):
+                start = time()
+                ref.get_download_checksums(pipeline_depth=depth, use_cache=False)
+                timings.append(time() - start)
+            best = min(timings)
+            print(f'{name:>10}: {best:.2f}s best of {rounds}, {size_mb / best:.0f} MB/s')
+    finally:
+        server.terminate()
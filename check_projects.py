@@ -1,7 +1,76 @@
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
 from delete_old import delete_old
+from hecksum import client
+from hecksum.airtable import TokenBucket
 from hecksum.db_models import Project
+from hecksum.changes import ChangeDetector
+from hecksum.outbox import requeue_dead_letters
+from hecksum.sinks import AirtableSink, ChangesOnly, FanOut, SINKS
+from settings import AIRTABLE_RATE_LIMIT, AIRTABLE_RETENTION_SHARE, HEARTBEAT_HOURS, HTTP_PER_HOST_LIMIT, RESULT_SINKS
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--workers', type=int, default=8, help='Number of projects checked concurrently')
+parser.add_argument(
+    '--per-host-limit',
+    type=int,
+    default=HTTP_PER_HOST_LIMIT,
+    help='Max concurrent requests to a single host',
+)
+parser.add_argument('--all-assets', action='store_true', help='Verify every asset listed in each manifest')
+parser.add_argument('--max-mb-in-flight', type=int, default=256, help='Download budget for --all-assets')
+parser.add_argument(
+    '--airtable-mode',
+    choices=('append', 'upsert'),
+    default='append',
+    help='append every check, or upsert the latest check per project and append only changes',
+)
+parser.add_argument(
+    '--sink',
+    action='append',
+    choices=sorted(SINKS),
+    help=f'Where to send results, may be repeated (default: {",".join(RESULT_SINKS)})',
+)
+parser.add_argument(
+    '--changes-only',
+    action='store_true',
+    help='Only send a result to Airtable when it differs from the last one sent for the project',
+)
+parser.add_argument(
+    '--heartbeat-hours',
+    type=float,
+    default=HEARTBEAT_HOURS,
+    help='With --changes-only, still send unchanged results this often (0 disables)',
+)
+parser.add_argument(
+    '--incremental',
+    action='store_true',
+    help='Reuse the last verdict when the release and artifact are unchanged since the last full verification',
+)
+parser.add_argument(
+    '--requeue-dead-letters',
+    action='store_true',
+    help='Give checks Airtable rejected as invalid another round of attempts from the outbox',
+)
+args = parser.parse_args()
+if args.all_assets and args.airtable_mode == 'upsert':
+    # The Latest table holds one record per project, but --all-assets produces one check per asset.
+    parser.error('--airtable-mode upsert cannot be combined with --all-assets')
+sink_names = args.sink or RESULT_SINKS
+# The shared session is configured once, before any background work starts using it.
+client.configure(args.per_host_limit)
 
-delete_old()
+# Retention runs alongside the checks, so split the base's rate limit between the two.
+retention_rate = AIRTABLE_RATE_LIMIT * AIRTABLE_RETENTION_SHARE
+retention_bucket = TokenBucket(retention_rate)
+writer_bucket = TokenBucket(AIRTABLE_RATE_LIMIT - retention_rate)
+background = ThreadPoolExecutor(max_workers=1)
+# In upsert mode the Checks table only holds changes, which are worth keeping.
+if 'airtable' in sink_names and args.airtable_mode == 'append':
+    retention = background.submit(delete_old, retention_bucket)
+else:
+    retention = None
 
 projects = [
     Project(airtable_id='rec1stqERwHeVoyTr', name='Codecov Bash Uploader'),
@@ -33,7 +102,30 @@ projects = [
     Project(airtable_id='recj96T0Pbp5wWuRX', name='Doppler windows armv7'),
     Project(airtable_id='recIuYEZhjk5he8Dw', name='Doppler windows armv6'),
 ]
-for project in projects:
-    check = project.check()
-    print(check)
-    check.post()
+if args.all_assets:
+    checks = Project.check_all(
+        projects,
+        max_workers=args.workers,
+        max_bytes_in_flight=args.max_mb_in_flight * 1024**2,
+        incremental=args.incremental,
+    )
+else:
+    checks = Project.check_many(
+        projects,
+        max_workers=args.workers,
+        incremental=args.incremental,
+    )
+if args.requeue_dead_letters:
+    print(f'Requeued {requeue_dead_letters()} dead letters')
+sinks = [SINKS[name]() for name in sink_names if name != 'airtable']
+if 'airtable' in sink_names:
+    airtable_sink = AirtableSink(upsert=args.airtable_mode == 'upsert', bucket=writer_bucket)
+    if args.changes_only:
+        airtable_sink = ChangesOnly(airtable_sink, ChangeDetector(heartbeat_hours=args.heartbeat_hours))
+    sinks.append(airtable_sink)
+with FanOut(sinks) as sink:
+    for check in checks:
+        sink.write([check])
+if retention:
+    retention.result()
+background.shutdown()
@@ -1,28 +1,43 @@
-import os
+from concurrent.futures import ThreadPoolExecutor
+from time import time
 
-import requests
+from hecksum import airtable
 
+OLD_CHECKS_FORMULA = "DATETIME_DIFF(TODAY(), {Checked UTC}, 'hours') > 24"
 
-def delete_old():
+
+def list_old(bucket: airtable.TokenBucket = airtable.rate_limit) -> list[str]:
+    record_ids = []
+    params = {
+        'filterByFormula': OLD_CHECKS_FORMULA,
+        # Only the record IDs are needed, so ask for a single small field instead of whole records.
+        'fields[]': 'Checked UTC',
+        'pageSize': 100,
+    }
     while True:
-        headers = {'Authorization': f'Bearer {os.environ["AIRTABLE_API_KEY"]}'}
-        payload = {
-            'filterByFormula': "DATETIME_DIFF(TODAY(), {Checked UTC}, 'hours') > 24"
-
-        }
-        checks = requests.get(
-            'https://api.airtable.com/v0/appPt1p6IWk5Cjv2E/Checks',
-            params=payload,
-            headers=headers
-        ).json()['records']
-        if not checks:
-            break
-        while checks:
-            to_delete = [check['id'] for check in checks[-10:]]
-            payload = {'records': to_delete}
-            r = requests.delete('https://api.airtable.com/v0/appPt1p6IWk5Cjv2E/Checks', params=payload, headers=headers)
-            r.raise_for_status()
-            del checks[-10:]
+        r = airtable.request('GET', 'Checks', bucket, params=params)
+        r.raise_for_status()
+        page = r.json()
+        record_ids.extend(record['id'] for record in page['records'])
+        if 'offset' not in page:
+            return record_ids
+        params['offset'] = page['offset']
+
+
+def delete_old(bucket: airtable.TokenBucket = airtable.rate_limit, max_workers: int = 5) -> int:
+    start = time()
+    record_ids = list_old(bucket)
+    batches = [record_ids[i:i + airtable.MAX_BATCH_SIZE] for i in range(0, len(record_ids), airtable.MAX_BATCH_SIZE)]
+
+    def delete(batch: list[str]) -> None:
+        r = airtable.request('DELETE', 'Checks', bucket, params={'records': batch})
+        r.raise_for_status()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        list(executor.map(delete, batches))
+    elapsed = time() - start
+    print(f'Deleted {len(record_ids)} old checks in {elapsed:.1f}s ({len(record_ids) / elapsed:.1f} records/s)')
+    return len(record_ids)
 
 
 if __name__ == '__main__':
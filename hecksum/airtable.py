@@ -0,0 +1,209 @@
+import atexit
+import os
+import threading
+import time
+from typing import Iterable, Optional, TYPE_CHECKING
+
+import requests
+
+from hecksum.client import session
+from settings import AIRTABLE_LATEST_TABLE, AIRTABLE_RATE_LIMIT
+
+if TYPE_CHECKING:
+    from hecksum.db_models import Check
+
+BASE_URL = 'https://api.airtable.com/v0/appPt1p6IWk5Cjv2E'
+MAX_BATCH_SIZE = 10
+MAX_ATTEMPTS = 5
+# Airtable asks clients to wait 30 seconds after exceeding the rate limit.
+DEFAULT_RETRY_AFTER = 30
+
+
+class TokenBucket:
+    """Blocks callers so that no more than ``rate`` requests per second go out on average."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if now >= self._paused_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = max(self._paused_until - now, (1 - self._tokens) / self.rate)
+            time.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+rate_limit = TokenBucket(AIRTABLE_RATE_LIMIT)
+
+
+def request(method: str, table: str, bucket: TokenBucket = rate_limit, **kwargs) -> requests.Response:
+    """Sends a request to an Airtable table, waiting out the rate limit and retrying on 429 responses."""
+    headers = {'Authorization': f'Bearer {os.environ["AIRTABLE_API_KEY"]}'}
+    for _ in range(MAX_ATTEMPTS):
+        bucket.acquire()
+        r = session.request(method, f'{BASE_URL}/{table}', headers=headers, **kwargs)
+        if r.status_code != 429:
+            break
+        bucket.pause(float(r.headers.get('Retry-After', DEFAULT_RETRY_AFTER)))
+    return r
+
+
+def create_records(table: str, records: list[dict], bucket: TokenBucket = rate_limit) -> requests.Response:
+    return request('POST', table, bucket, json={'records': [{'fields': fields} for fields in records], 'typecast': True})
+
+
+class CheckWriter:
+    """
+    Buffers checks and creates them in batches of up to ten records, the most Airtable accepts per request.
+    The buffer is flushed when it fills up, every ``flush_interval`` seconds, and on close or interpreter shutdown.
+    """
+
+    def __init__(
+        self,
+        table: str = 'Checks',
+        batch_size: int = MAX_BATCH_SIZE,
+        flush_interval: float = 5,
+        bucket: TokenBucket = rate_limit,
+    ):
+        self.table = table
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.bucket = bucket
+        self.responses: list[requests.Response] = []
+        self._buffer: list['Check'] = []
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._closed = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_periodically, daemon=True)
+        self._flusher.start()
+        atexit.register(self.close)
+
+    def add(self, check: 'Check') -> None:
+        with self._lock:
+            self._buffer.append(check)
+            full = len(self._buffer) >= self.batch_size
+        if full:
+            self.flush()
+
+    def add_many(self, checks: Iterable['Check']) -> None:
+        for check in checks:
+            self.add(check)
+
+    def flush(self) -> None:
+        """Writes out everything buffered so far. A batch Airtable rejects goes back to the front of the buffer."""
+        with self._write_lock:
+            while True:
+                with self._lock:
+                    batch, self._buffer = self._buffer[:self.batch_size], self._buffer[self.batch_size:]
+                if not batch:
+                    return
+                try:
+                    self._write(batch)
+                except Exception:
+                    with self._lock:
+                        self._buffer[:0] = batch
+                    raise
+
+    def write(self, checks: list['Check']) -> None:
+        """Writes ``checks`` right away, bypassing the buffer, and raises if Airtable rejects them."""
+        for i in range(0, len(checks), self.batch_size):
+            with self._write_lock:
+                self._write(checks[i:i + self.batch_size])
+
+    def close(self) -> None:
+        if not self._closed.is_set():
+            self._closed.set()
+            atexit.unregister(self.close)
+        # Let a periodic flush that already took a batch finish before the final flush.
+        self._flusher.join()
+        self.flush()
+
+    def __enter__(self) -> 'CheckWriter':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _write(self, batch: list['Check']) -> None:
+        r = create_records(self.table, [check.airtable_fields() for check in batch], self.bucket)
+        self.responses.append(r)
+        r.raise_for_status()
+
+    def _flush_periodically(self) -> None:
+        while not self._closed.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f'Flushing checks to Airtable failed, retrying later: {e}')
+
+
+class UpsertCheckWriter(CheckWriter):
+    """
+    Keeps one record per project in ``latest_table`` up to date with performUpsert, keyed on its Project ID field,
+    and only appends a check to the history ``table`` when its status or checksum differs from the latest record.
+    It tracks one asset per project, so it can't be used with Project.check_all.
+    """
+
+    def __init__(self, table: str = 'Checks', latest_table: str = AIRTABLE_LATEST_TABLE, **kwargs):
+        self.latest_table = latest_table
+        self._latest: Optional[dict[str, tuple]] = None
+        super().__init__(table, **kwargs)
+
+    def _write(self, batch: list['Check']) -> None:
+        if self._latest is None:
+            self._latest = self._load_latest()
+        # A batch replayed from the outbox can hold several runs of a project; only its newest check is the latest.
+        batch = sorted(batch, key=lambda check: check.checked_at)
+        newest = {check.project.airtable_id: check for check in batch}
+        records = [
+            {'fields': {**check.airtable_fields(), 'Project ID': project_id}} for project_id, check in newest.items()
+        ]
+        r = request(
+            'PATCH',
+            self.latest_table,
+            self.bucket,
+            json={'performUpsert': {'fieldsToMergeOn': ['Project ID']}, 'records': records, 'typecast': True},
+        )
+        self.responses.append(r)
+        r.raise_for_status()
+        latest = dict(self._latest)
+        changed = []
+        for check in batch:
+            if latest.get(check.project.airtable_id) != _state(check):
+                changed.append(check)
+            latest[check.project.airtable_id] = _state(check)
+        if changed:
+            super()._write(changed)
+        self._latest = latest
+
+    def _load_latest(self) -> dict[str, tuple]:
+        latest = {}
+        params = {'fields[]': ['Project ID', 'Status', 'Checksum'], 'pageSize': 100}
+        while True:
+            r = request('GET', self.latest_table, self.bucket, params=params)
+            r.raise_for_status()
+            page = r.json()
+            for record in page['records']:
+                fields = record['fields']
+                latest[fields.get('Project ID')] = (fields.get('Status'), fields.get('Checksum'))
+            if 'offset' not in page:
+                return latest
+            params['offset'] = page['offset']
+
+
+def _state(check: 'Check') -> tuple:
+    return check.status, check.checksum
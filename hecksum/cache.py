@@ -0,0 +1,53 @@
+from concurrent.futures import Future
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Hashable, Optional, TypeVar
+
+T = TypeVar('T')
+
+
+class RunCache:
+    """
+    Memoizes loaded values by key for the duration of a run, or for ``ttl`` seconds.
+    Concurrent callers asking for the same key share a single in-flight load.
+    """
+
+    def __init__(self, ttl: Optional[float] = None):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: dict[Hashable, tuple[float, Future]] = {}
+
+    def get(self, key: Hashable, load: Callable[[], T]) -> T:
+        with self._lock:
+            entry = self._entries.get(key)
+            owner = entry is None or self._expired(entry[0])
+            if owner:
+                future = Future()
+                self._entries[key] = (time.monotonic(), future)
+            else:
+                future = entry[1]
+        if owner:
+            try:
+                future.set_result(load())
+            except BaseException as e:
+                with self._lock:
+                    if self._entries.get(key, (None, None))[1] is future:
+                        del self._entries[key]
+                future.set_exception(e)
+        return future.result()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries = {}
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl is not None and time.monotonic() - created > self.ttl
+
+
+def connect_sqlite(path: str) -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    connection = sqlite3.connect(path, timeout=30)
+    connection.execute('PRAGMA journal_mode=WAL')
+    return connection
@@ -0,0 +1,64 @@
+from contextlib import closing
+import json
+import threading
+import time
+from typing import Iterable, Optional
+
+from hecksum.cache import connect_sqlite
+from hecksum.db_models import Check
+from settings import CHANGES_PATH
+
+
+class ChangeDetector:
+    """
+    Remembers the last result emitted for every project and download URL, so results identical to it can be skipped.
+    With ``heartbeat_hours`` set, an unchanged result is still emitted once that long has passed since the last one.
+    """
+
+    def __init__(self, path: str = CHANGES_PATH, heartbeat_hours: Optional[float] = None):
+        self.path = path
+        self.heartbeat_hours = heartbeat_hours
+        self._lock = threading.Lock()
+        with closing(connect_sqlite(path)) as connection, connection:
+            columns = {column[1] for column in connection.execute('PRAGMA table_info(last_emitted)')}
+            if columns and 'download_url' not in columns:
+                # Results used to be keyed on the project alone; starting over only re-emits each result once.
+                connection.execute('DROP TABLE last_emitted')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS last_emitted ('
+                'project_id TEXT NOT NULL, download_url TEXT NOT NULL, state TEXT NOT NULL, emitted_at REAL NOT NULL, '
+                'PRIMARY KEY (project_id, download_url))'
+            )
+
+    def changed(self, checks: Iterable[Check]) -> list[Check]:
+        """Returns the checks worth emitting. Call ``record`` once they have been emitted."""
+        now = time.time()
+        with closing(connect_sqlite(self.path)) as connection:
+            return [check for check in checks if self._worth_emitting(connection, check, now)]
+
+    def record(self, checks: Iterable[Check]) -> None:
+        """Remembers ``checks`` as the latest emitted results."""
+        now = time.time()
+        with self._lock, closing(connect_sqlite(self.path)) as connection, connection:
+            connection.executemany(
+                'INSERT OR REPLACE INTO last_emitted (project_id, download_url, state, emitted_at) VALUES (?, ?, ?, ?)',
+                [(*_key(check), json.dumps(_state(check)), now) for check in checks],
+            )
+
+    def _worth_emitting(self, connection, check: Check, now: float) -> bool:
+        row = connection.execute(
+            'SELECT state, emitted_at FROM last_emitted WHERE project_id = ? AND download_url = ?', _key(check)
+        ).fetchone()
+        return not row or row[0] != json.dumps(_state(check)) or self._heartbeat_due(row[1], now)
+
+    def _heartbeat_due(self, emitted_at: float, now: float) -> bool:
+        return bool(self.heartbeat_hours) and now - emitted_at >= self.heartbeat_hours * 3600
+
+
+def _key(check: Check) -> tuple[str, str]:
+    # Checks that failed before resolving a download URL share one key per project.
+    return check.project.airtable_id, check.download_url or ''
+
+
+def _state(check: Check) -> list:
+    return [check.status, check.checksum, check.checksum_url, check.download_url]
@@ -0,0 +1,70 @@
+from contextlib import contextmanager
+import threading
+from typing import Iterator, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from settings import HTTP_PER_HOST_LIMIT, HTTP_POOL_SIZE, HTTP_TIMEOUT
+
+
+class HostLimiter:
+    """Caps the number of concurrent requests made to any single host."""
+
+    def __init__(self, limit: Optional[int] = None):
+        self.limit = limit
+        self._lock = threading.Lock()
+        self._semaphores: dict[str, threading.BoundedSemaphore] = {}
+
+    def configure(self, limit: Optional[int]) -> None:
+        with self._lock:
+            self.limit = limit
+            self._semaphores = {}
+
+    @contextmanager
+    def hold(self, url: str) -> Iterator[None]:
+        if self.limit is None:
+            yield
+            return
+        host = urlsplit(url).hostname
+        with self._lock:
+            semaphore = self._semaphores.setdefault(host, threading.BoundedSemaphore(self.limit))
+        with semaphore:
+            yield
+
+
+class Session(requests.Session):
+    """A keep-alive session with a default timeout, shared by every hecksum request."""
+
+    def __init__(self, timeout: float = HTTP_TIMEOUT, pool_size: int = HTTP_POOL_SIZE):
+        super().__init__()
+        self.timeout = timeout
+        self.resize(pool_size)
+
+    def resize(self, pool_size: int) -> None:
+        adapter = HTTPAdapter(pool_maxsize=pool_size)
+        for prefix in ('https://', 'http://'):
+            old_adapter = self.adapters.get(prefix)
+            self.mount(prefix, adapter)
+            if old_adapter is not None:
+                old_adapter.close()
+
+    def request(self, method, url, **kwargs) -> requests.Response:
+        kwargs.setdefault('timeout', self.timeout)
+        return super().request(method, url, **kwargs)
+
+
+session = Session()
+host_limiter = HostLimiter(HTTP_PER_HOST_LIMIT or None)
+
+
+def configure(per_host_limit: Optional[int]) -> None:
+    """
+    Sets the per-host limit, which otherwise defaults to HTTP_PER_HOST_LIMIT; None or 0 lifts it.
+    This is the only way to change the limit. Call it before any requests are in flight, since it replaces the
+    session's pools.
+    """
+    host_limiter.configure(per_host_limit or None)
+    # Airtable requests aren't subject to the host limit, so never shrink the pools below the default.
+    session.resize(max(per_host_limit or 0, HTTP_POOL_SIZE))
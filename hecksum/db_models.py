@@ -1,12 +1,17 @@
+from concurrent.futures import as_completed, Executor, Future, ThreadPoolExecutor
+from datetime import datetime, timezone
 from enum import Enum
-import os
-from typing import ClassVar, Optional
+from time import time
+from typing import ClassVar, Iterable, Iterator, Optional
 
-from pydantic import BaseModel, HttpUrl
+from pydantic import BaseModel, Field, HttpUrl
 import requests
 
+from hecksum import airtable
 from hecksum import references as refs
-from settings import IGNORED_EXCEPTIONS
+from hecksum.downloads import ByteBudget
+from hecksum.incremental import fingerprints
+from settings import AIRTABLE_CACHED_FIELD, IGNORED_EXCEPTIONS, REVERIFY_HOURS
 
 
 class Project(BaseModel):
@@ -44,25 +49,124 @@ class Project(BaseModel):
         'recIuYEZhjk5he8Dw': refs.doppler_windows_armv6,
     }
 
-    def check(self) -> 'Check':
-        reference_factory = self.REFERENCE_FACTORIES[self.airtable_id]
-        ref = reference_factory.make()
+    @property
+    def reference_factory(self) -> refs.ReferenceFactory:
+        return self.REFERENCE_FACTORIES[self.airtable_id]
+
+    def check(self, incremental: bool = False) -> 'Check':
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            speculation = self._speculate(executor, incremental)
+            return self._verify(self.reference_factory.make(), speculation=speculation, incremental=incremental)
+
+    def _speculate(self, executor: Executor, incremental: bool = False) -> Optional[tuple[refs.Reference, Future]]:
+        # When the download URL is known before populating, hash it while the checksum is being fetched.
+        # Incremental checks usually skip the download, so speculating would mostly waste it.
+        factory = self.reference_factory
+        if incremental or not (factory.download_url and factory.speculative_download):
+            return None
+        ref = refs.Reference(**factory.dict())
+        return ref, executor.submit(ref.get_download_checksums)
+
+    def _verify(
+        self,
+        ref: refs.Reference,
+        budget: Optional[ByteBudget] = None,
+        speculation: Optional[tuple[refs.Reference, Future]] = None,
+        incremental: bool = False,
+    ) -> 'Check':
+        """
+        Downloads and hashes the populated reference. In incremental mode, a reference whose release and artifact
+        fingerprint match the last full verification reuses that verdict, unless it is older than REVERIFY_HOURS.
+        """
+        start = time()
+        fingerprint = None
+        cached = False
         try:
             if not ref.populated():
                 raise Exception(f'Reference not populated. {ref}')
-            download_checksum = ref.get_download_checksum()
+            speculative_ref, speculative_digests = speculation or (None, None)
+            previous = fingerprints.get(self.airtable_id, ref.download_url) if incremental else None
+            if incremental:
+                fingerprint = ref.fingerprint()
+            if (
+                fingerprint
+                and previous
+                and previous.fingerprint == fingerprint
+                and time() - previous.verified_at < REVERIFY_HOURS * 3600
+            ):
+                digests = previous.digests
+                cached = True
+            elif speculative_ref and (speculative_ref.download_url, speculative_ref.algorithms) == (
+                ref.download_url,
+                ref.algorithms,
+            ):
+                digests = speculative_digests.result()
+                ref.download_size = speculative_ref.download_size
+                ref.digest_cache_hit = speculative_ref.digest_cache_hit
+            else:
+                # Incremental checks only get here to verify in full, so the digest cache mustn't answer for them.
+                digests = ref.get_download_checksums(use_cache=not incremental, budget=budget)
         except IGNORED_EXCEPTIONS:
+            digests = None
             status = Status.error
         else:
-            status = Status.passing if ref.checksum == download_checksum else Status.failing
+            status = Status.passing if ref.checksum == digests[ref.algorithm] else Status.failing
+            if fingerprint and not cached:
+                fingerprints.put(self.airtable_id, ref.download_url, fingerprint, status.value, digests)
         return Check(
             project=self,
             status=status,
             checksum=ref.checksum,
             checksum_url=ref.checksum_url,
             download_url=ref.download_url,
+            digests=digests,
+            digest_cache_hit=ref.digest_cache_hit,
+            duration=time() - start,
+            download_size=ref.download_size,
+            cached=cached,
         )
 
+    @classmethod
+    def check_many(
+        cls,
+        projects: Iterable['Project'],
+        max_workers: int = 8,
+        incremental: bool = False,
+    ) -> Iterator['Check']:
+        """
+        Checks ``projects`` concurrently and yields their checks as they complete.
+        Requests to any one host are capped by the shared client, see ``client.configure``.
+        """
+        projects = list(projects)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            speculations = [project._speculate(executor, incremental) for project in projects]
+            references = refs.ReferenceFactory.make_many(project.reference_factory for project in projects)
+            futures = [
+                executor.submit(project._verify, ref, speculation=speculation, incremental=incremental)
+                for project, ref, speculation in zip(projects, references, speculations)
+            ]
+            for future in as_completed(futures):
+                yield future.result()
+
+    @classmethod
+    def check_all(
+        cls,
+        projects: Iterable['Project'],
+        max_workers: int = 8,
+        max_bytes_in_flight: int = 256 * 1024**2,
+        incremental: bool = False,
+    ) -> Iterator['Check']:
+        """Like check_many, but verifies every asset of each project and yields one check per asset."""
+        budget = ByteBudget(max_bytes_in_flight)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(project._verify, ref, budget, incremental=incremental)
+                for project in projects
+                for ref in project.reference_factory.make_all()
+            ]
+            for future in as_completed(futures):
+                yield future.result()
+
 
 class Status(str, Enum):
     passing = 'Passing'
@@ -76,20 +180,31 @@ class Check(BaseModel):
     checksum: Optional[str]
     checksum_url: Optional[HttpUrl]
     download_url: Optional[HttpUrl]
+    digests: Optional[dict[str, str]] = None
+    digest_cache_hit: Optional[bool] = None
+    checked_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    duration: Optional[float] = None
+    download_size: Optional[int] = None
+    cached: bool = False
 
     class Config:
         use_enum_values = True
 
-    def post(self) -> requests.Response:
-        headers = {'Authorization': f'Bearer {os.environ["AIRTABLE_API_KEY"]}'}
-        payload = {
-            'fields': {
-                'Project': [self.project.airtable_id],
-                'Status': self.status,
-                'Checksum URL': self.checksum_url,
-                'Download': self.download_url,
-                'Checksum': self.checksum
-            },
-            'typecast': True
+    def airtable_fields(self) -> dict:
+        return {
+            'Project': [self.project.airtable_id],
+            'Status': self.status,
+            'Checksum URL': self.checksum_url,
+            'Download': self.download_url,
+            'Checksum': self.checksum,
+            **({AIRTABLE_CACHED_FIELD: self.cached} if AIRTABLE_CACHED_FIELD else {}),
         }
-        return requests.post('https://api.airtable.com/v0/appPt1p6IWk5Cjv2E/Checks', json=payload, headers=headers)
+
+    def post(self) -> requests.Response:
+        return airtable.create_records('Checks', [self.airtable_fields()])
+
+    @classmethod
+    def post_many(cls, checks: Iterable['Check']) -> list[requests.Response]:
+        with airtable.CheckWriter() as writer:
+            writer.add_many(checks)
+        return writer.responses
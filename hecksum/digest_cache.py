@@ -0,0 +1,73 @@
+from contextlib import closing
+import json
+import os
+import time
+from typing import NamedTuple, Optional
+
+from hecksum.cache import connect_sqlite
+from settings import CACHE_DIR, DIGEST_CACHE_MAX_AGE_HOURS, DIGEST_CACHE_SIZE
+
+
+class CachedDigests(NamedTuple):
+    etag: Optional[str]
+    last_modified: Optional[str]
+    size: Optional[int]
+    digests: dict[str, str]
+
+
+class DigestCache:
+    """
+    Remembers the digests of downloaded artifacts together with their HTTP validators,
+    keeping at most ``max_entries`` URLs and evicting the least recently used ones.
+    Digests hashed more than ``max_age`` seconds ago are misses, so every artifact is re-hashed periodically
+    even if the server keeps reporting it unchanged.
+    """
+
+    def __init__(self, path: str, max_entries: int, max_age: float):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age
+
+    def get(self, url: str) -> Optional[CachedDigests]:
+        with closing(self._connect()) as connection, connection:
+            row = connection.execute(
+                'SELECT etag, last_modified, size, digests FROM digests WHERE url = ? AND verified_at >= ?',
+                (url, time.time() - self.max_age),
+            ).fetchone()
+            if row is None:
+                return None
+            connection.execute('UPDATE digests SET last_used = ? WHERE url = ?', (time.time(), url))
+        etag, last_modified, size, digests = row
+        return CachedDigests(etag, last_modified, size, json.loads(digests))
+
+    def put(self, url: str, cached: CachedDigests) -> None:
+        now = time.time()
+        with closing(self._connect()) as connection, connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO digests (url, etag, last_modified, size, digests, verified_at, last_used) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (url, cached.etag, cached.last_modified, cached.size, json.dumps(cached.digests), now, now),
+            )
+            connection.execute(
+                'DELETE FROM digests WHERE url NOT IN (SELECT url FROM digests ORDER BY last_used DESC LIMIT ?)',
+                (self.max_entries,),
+            )
+
+    def _connect(self):
+        connection = connect_sqlite(self.path)
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS digests ('
+            'url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, size INTEGER, digests TEXT NOT NULL, '
+            'verified_at REAL NOT NULL DEFAULT 0, last_used REAL NOT NULL)'
+        )
+        if 'verified_at' not in {column[1] for column in connection.execute('PRAGMA table_info(digests)')}:
+            # Entries from before verified_at was tracked count as expired.
+            connection.execute('ALTER TABLE digests ADD COLUMN verified_at REAL NOT NULL DEFAULT 0')
+        return connection
+
+
+digest_cache = (
+    DigestCache(os.path.join(CACHE_DIR, 'digests.sqlite3'), DIGEST_CACHE_SIZE, DIGEST_CACHE_MAX_AGE_HOURS * 3600)
+    if DIGEST_CACHE_SIZE
+    else None
+)
@@ -0,0 +1,259 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from itertools import islice
+import queue
+import threading
+from typing import Iterable, Iterator, NamedTuple, Optional
+
+import requests
+
+from hecksum.client import host_limiter, session
+
+CHUNK_SIZE = 1024**2
+
+
+class RangeError(Exception):
+    pass
+
+
+class ByteBudget:
+    """Limits the total size of downloads in flight. A download larger than the whole budget runs alone."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._in_flight = 0
+        self._condition = threading.Condition()
+
+    @contextmanager
+    def hold(self, size: int) -> Iterator[None]:
+        with self._condition:
+            self._condition.wait_for(lambda: self._in_flight == 0 or self._in_flight + size <= self.limit)
+            self._in_flight += size
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._in_flight -= size
+                self._condition.notify_all()
+
+
+class Download(NamedTuple):
+    size: Optional[int]
+    etag: Optional[str]
+    last_modified: Optional[str]
+    not_modified: bool = False
+
+
+def hash_url(
+    url: str,
+    hashes: Iterable,
+    pipeline_depth: int = 0,
+    parallel_segments: int = 1,
+    segment_size: int = 8 * CHUNK_SIZE,
+    etag: Optional[str] = None,
+    last_modified: Optional[str] = None,
+    size: Optional[int] = None,
+    budget: Optional[ByteBudget] = None,
+) -> Download:
+    """
+    Downloads ``url`` into every hash object in ``hashes``.
+    With ``parallel_segments`` above one, servers that advertise byte ranges are fetched as concurrent
+    ``segment_size`` ranges; everything else is read as a single stream.
+    When the validators of a previous download are passed, the request is conditional and nothing is hashed
+    if the server reports the file unchanged; the result then has ``not_modified`` set.
+    With a ``budget``, the body is only requested once its size fits in the bytes still available.
+    """
+    hashes = list(hashes)
+    # The budget is always taken before a host slot, so a download waiting for bytes never keeps
+    # other downloads from the same host waiting for a slot.
+    expected_size = None
+    if parallel_segments > 1:
+        with host_limiter.hold(url):
+            head = session.head(url, allow_redirects=True)
+        head.raise_for_status()
+        download = _download(head, int(head.headers.get('Content-Length', 0)))
+        if _unchanged(download, etag, last_modified, size):
+            return download._replace(not_modified=True)
+        if (
+            head.headers.get('Accept-Ranges') == 'bytes'
+            and head.headers.get('Content-Encoding', 'identity') == 'identity'
+            and download.size > segment_size
+        ):
+            with _hold(budget, download.size):
+                hash_ranges(head.url, download.size, hashes, segment_size, parallel_segments, download.etag)
+            return download
+        expected_size = download.size
+    elif budget:
+        expected_size = probe(url).size
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+    with _hold(budget, expected_size or CHUNK_SIZE), host_limiter.hold(url):
+        with session.get(url, headers=headers, stream=True) as r:
+            r.raise_for_status()
+            if r.status_code == 304:
+                return Download(size, etag, last_modified, not_modified=True)
+            return _download(r, hash_response_pipelined(r, hashes, depth=pipeline_depth))
+
+
+def probe(url: str) -> Download:
+    """Returns the size and validators a HEAD request reports for ``url`` without downloading it."""
+    with host_limiter.hold(url):
+        head = session.head(url, allow_redirects=True)
+    head.raise_for_status()
+    size = head.headers.get('Content-Length')
+    return _download(head, int(size) if size is not None else None)
+
+
+def hash_ranges(
+    url: str,
+    size: int,
+    hashes: Iterable,
+    segment_size: int,
+    parallelism: int,
+    etag: Optional[str] = None,
+) -> int:
+    """
+    Fetches ``size`` bytes of ``url`` as byte ranges, ``parallelism`` at a time, and hashes them strictly in order.
+    At most ``parallelism`` segments are in flight or waiting to be hashed, which bounds memory.
+    """
+    hashes = list(hashes)
+    headers = {}
+    if etag and not etag.startswith('W/'):
+        # The server answers 200 instead of 206 if the file changed between segments.
+        headers['If-Range'] = etag
+
+    def fetch(start: int) -> bytes:
+        end = min(start + segment_size, size) - 1
+        with host_limiter.hold(url):
+            r = session.get(url, headers={**headers, 'Range': f'bytes={start}-{end}'})
+        r.raise_for_status()
+        if r.status_code != 206 or len(r.content) != end - start + 1:
+            raise RangeError(f'{url} did not return bytes {start}-{end}')
+        return r.content
+
+    offsets = iter(range(0, size, segment_size))
+    with ThreadPoolExecutor(max_workers=parallelism) as executor:
+        window = deque(executor.submit(fetch, offset) for offset in islice(offsets, parallelism))
+        try:
+            while window:
+                segment = window.popleft().result()
+                for h in hashes:
+                    h.update(segment)
+                offset = next(offsets, None)
+                if offset is not None:
+                    window.append(executor.submit(fetch, offset))
+        finally:
+            for future in window:
+                future.cancel()
+    return size
+
+
+def hash_response(r: requests.Response, hashes: Iterable, chunk_size: int = CHUNK_SIZE) -> int:
+    """
+    Feeds the body of a streamed response to every hash object in ``hashes`` and returns the number of bytes read.
+    Identity-encoded bodies are read straight off the socket into one reusable buffer, so memory stays flat and
+    no per-chunk ``bytes`` objects are allocated. Compressed bodies fall back to ``iter_content`` for decoding.
+    """
+    hashes = list(hashes)
+    fp = _identity_fp(r)
+    if fp is None:
+        return _hash_chunks(r.iter_content(chunk_size), hashes)
+    view = memoryview(bytearray(chunk_size))
+    size = 0
+    while True:
+        n = fp.readinto(view)
+        if not n:
+            break
+        chunk = view[:n]
+        for h in hashes:
+            h.update(chunk)
+        size += n
+    r.raw.release_conn()
+    return size
+
+
+def _hash_chunks(chunks: Iterable[bytes], hashes: list) -> int:
+    size = 0
+    for chunk in chunks:
+        for h in hashes:
+            h.update(chunk)
+        size += len(chunk)
+    return size
+
+
+def hash_response_pipelined(r: requests.Response, hashes: Iterable, chunk_size: int = CHUNK_SIZE, depth: int = 4) -> int:
+    """
+    Like ``hash_response``, but a background thread reads the body into a ring of ``depth`` reusable buffers while
+    the calling thread hashes the filled ones, so network reads and hashing overlap.
+    """
+    hashes = list(hashes)
+    fp = _identity_fp(r)
+    if fp is None or depth < 2:
+        return hash_response(r, hashes, chunk_size)
+    buffers = [memoryview(bytearray(chunk_size)) for _ in range(depth)]
+    free = queue.Queue()
+    filled = queue.Queue()
+    for i in range(depth):
+        free.put(i)
+
+    def read() -> None:
+        try:
+            while True:
+                i = free.get()
+                if i is None:
+                    return
+                n = fp.readinto(buffers[i])
+                filled.put((i, n))
+                if not n:
+                    return
+        except BaseException as e:
+            filled.put((None, e))
+
+    reader = threading.Thread(target=read, daemon=True)
+    reader.start()
+    size = 0
+    try:
+        while True:
+            i, n = filled.get()
+            if i is None:
+                raise n
+            if not n:
+                break
+            chunk = buffers[i][:n]
+            for h in hashes:
+                h.update(chunk)
+            size += n
+            free.put(i)
+    finally:
+        free.put(None)
+    reader.join()
+    r.raw.release_conn()
+    return size
+
+
+def _identity_fp(r: requests.Response):
+    # urllib3's own readinto copies through read(), so go to the underlying http.client response instead.
+    fp = getattr(r.raw, '_fp', None)
+    if r.headers.get('Content-Encoding', 'identity') != 'identity' or not hasattr(fp, 'readinto'):
+        return None
+    return fp
+
+
+def _hold(budget: Optional[ByteBudget], size: int):
+    return budget.hold(size) if budget else nullcontext()
+
+
+def _download(r: requests.Response, size: Optional[int]) -> Download:
+    return Download(size, r.headers.get('ETag'), r.headers.get('Last-Modified'))
+
+
+def _unchanged(download: Download, etag: Optional[str], last_modified: Optional[str], size: Optional[int]) -> bool:
+    if size is not None and download.size != size:
+        return False
+    if etag and download.etag:
+        return etag == download.etag
+    return bool(last_modified) and last_modified == download.last_modified
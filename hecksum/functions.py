@@ -1,7 +1,17 @@
 import requests
 
+from hecksum.cache import RunCache
+from hecksum.client import host_limiter, session
+from hecksum.http_cache import http_cache
+from settings import RESPONSE_CACHE_TTL
 
-def get_raised(url: str) -> requests.Response:
-    r = requests.get(url)
+response_cache = RunCache(ttl=RESPONSE_CACHE_TTL)
+
+
+def get_raised(url: str, cache: bool = True) -> requests.Response:
+    if cache:
+        return response_cache.get(url, lambda: http_cache.get(url) if http_cache else get_raised(url, cache=False))
+    with host_limiter.hold(url):
+        r = session.get(url)
     r.raise_for_status()
     return r
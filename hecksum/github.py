@@ -0,0 +1,24 @@
+from urllib.parse import unquote
+
+from hecksum.cache import RunCache
+from hecksum.client import host_limiter, session
+from hecksum.functions import get_raised
+from settings import RESPONSE_CACHE_TTL
+
+release_tags = RunCache(ttl=RESPONSE_CACHE_TTL)
+
+
+def latest_release_tag(repository: str) -> str:
+    """Returns the tag of the latest release of ``repository``, e.g. ``'DopplerHQ/cli'``, once per run."""
+    return release_tags.get(repository, lambda: _resolve_latest_release_tag(repository))
+
+
+def _resolve_latest_release_tag(repository: str) -> str:
+    # releases/latest redirects to releases/tag/<tag>; reading the Location header avoids downloading the page.
+    url = f'https://github.com/{repository}/releases/latest'
+    with host_limiter.hold(url):
+        r = session.head(url, allow_redirects=False)
+    location = r.headers.get('Location', '')
+    if r.is_redirect and '/releases/tag/' in location:
+        return unquote(location.rsplit('/releases/tag/', 1)[1])
+    return get_raised(f'https://api.github.com/repos/{repository}/releases/latest').json()['tag_name']
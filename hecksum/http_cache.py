@@ -0,0 +1,104 @@
+from contextlib import closing
+import json
+import os
+import threading
+import time
+from typing import NamedTuple, Optional
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from hecksum.client import host_limiter, session
+from hecksum.cache import connect_sqlite
+from settings import CACHE_DIR, HTTP_CACHE, HTTP_CACHE_STALE_WINDOW
+
+
+class CachedResponse(NamedTuple):
+    url: str
+    headers: dict[str, str]
+    encoding: Optional[str]
+    content: bytes
+    fetched_at: float
+
+    def response(self) -> requests.Response:
+        r = requests.Response()
+        r.status_code = 200
+        r.url = self.url
+        r.headers = CaseInsensitiveDict(self.headers)
+        r.encoding = self.encoding
+        r._content = self.content
+        return r
+
+
+class HttpCache:
+    """
+    Persists response bodies with their ETag/Last-Modified and revalidates them with conditional requests.
+    Entries younger than ``stale_window`` seconds are served immediately and revalidated in the background.
+    """
+
+    def __init__(self, path: str, stale_window: float = 0):
+        self.path = path
+        self.stale_window = stale_window
+
+    def get(self, url: str) -> requests.Response:
+        cached = self._load(url)
+        if cached is None:
+            return self._revalidate(url, None)
+        if time.time() - cached.fetched_at < self.stale_window:
+            threading.Thread(target=self._revalidate, args=(url, cached), daemon=True).start()
+            return cached.response()
+        return self._revalidate(url, cached)
+
+    def _revalidate(self, url: str, cached: Optional[CachedResponse]) -> requests.Response:
+        headers = {}
+        if cached and cached.headers.get('ETag'):
+            headers['If-None-Match'] = cached.headers['ETag']
+        if cached and cached.headers.get('Last-Modified'):
+            headers['If-Modified-Since'] = cached.headers['Last-Modified']
+        with host_limiter.hold(url):
+            r = session.get(url, headers=headers)
+        if r.status_code == 304 and cached:
+            cached = cached._replace(
+                headers={**cached.headers, **_validators(r.headers)},
+                fetched_at=time.time(),
+            )
+            self._store(url, cached)
+            return cached.response()
+        r.raise_for_status()
+        if _validators(r.headers):
+            self._store(url, CachedResponse(r.url, _validators(r.headers), r.encoding, r.content, time.time()))
+        return r
+
+    def _load(self, url: str) -> Optional[CachedResponse]:
+        with closing(self._connect()) as connection:
+            row = connection.execute(
+                'SELECT final_url, headers, encoding, content, fetched_at FROM responses WHERE url = ?', (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        final_url, headers, encoding, content, fetched_at = row
+        return CachedResponse(final_url, json.loads(headers), encoding, content, fetched_at)
+
+    def _store(self, url: str, cached: CachedResponse) -> None:
+        with closing(self._connect()) as connection, connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO responses (url, final_url, headers, encoding, content, fetched_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (url, cached.url, json.dumps(cached.headers), cached.encoding, cached.content, cached.fetched_at),
+            )
+
+    def _connect(self):
+        connection = connect_sqlite(self.path)
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            'url TEXT PRIMARY KEY, final_url TEXT NOT NULL, headers TEXT NOT NULL, encoding TEXT, '
+            'content BLOB NOT NULL, fetched_at REAL NOT NULL)'
+        )
+        return connection
+
+
+def _validators(headers) -> dict[str, str]:
+    return {name: headers[name] for name in ('ETag', 'Last-Modified') if headers.get(name)}
+
+
+http_cache = HttpCache(os.path.join(CACHE_DIR, 'http.sqlite3'), HTTP_CACHE_STALE_WINDOW) if HTTP_CACHE else None
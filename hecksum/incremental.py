@@ -0,0 +1,53 @@
+from contextlib import closing
+import json
+import time
+from typing import NamedTuple, Optional
+
+from hecksum.cache import connect_sqlite
+from settings import FINGERPRINTS_PATH
+
+
+class Verdict(NamedTuple):
+    fingerprint: dict
+    status: str
+    digests: Optional[dict[str, str]]
+    verified_at: float
+
+
+class FingerprintStore:
+    """Remembers the outcome of the last full verification of every project's artifact, with its fingerprint."""
+
+    def __init__(self, path: str = FINGERPRINTS_PATH):
+        self.path = path
+
+    def get(self, project_id: str, download_url: str) -> Optional[Verdict]:
+        with closing(self._connect()) as connection:
+            row = connection.execute(
+                'SELECT fingerprint, status, digests, verified_at FROM verdicts '
+                'WHERE project_id = ? AND download_url = ?',
+                (project_id, download_url),
+            ).fetchone()
+        if row is None:
+            return None
+        fingerprint, status, digests, verified_at = row
+        return Verdict(json.loads(fingerprint), status, json.loads(digests), verified_at)
+
+    def put(self, project_id: str, download_url: str, fingerprint: dict, status: str, digests: dict[str, str]) -> None:
+        with closing(self._connect()) as connection, connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO verdicts (project_id, download_url, fingerprint, status, digests, verified_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (project_id, download_url, json.dumps(fingerprint), status, json.dumps(digests), time.time()),
+            )
+
+    def _connect(self):
+        connection = connect_sqlite(self.path)
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS verdicts ('
+            'project_id TEXT NOT NULL, download_url TEXT NOT NULL, fingerprint TEXT NOT NULL, status TEXT NOT NULL, '
+            'digests TEXT, verified_at REAL NOT NULL, PRIMARY KEY (project_id, download_url))'
+        )
+        return connection
+
+
+fingerprints = FingerprintStore()
@@ -0,0 +1,46 @@
+"""
+Parsers for published checksum manifests. Supported line formats:
+
+    GNU coreutils:  <digest>  <filename>   (or <digest> *<filename> for binary mode)
+    BSD:            SHA256 (<filename>) = <digest>
+    Sidecar:        <digest>               (a file holding a single digest, indexed under '')
+"""
+import re
+from typing import Iterable, NamedTuple, Optional
+
+from hecksum.cache import RunCache
+from hecksum.functions import get_raised
+from settings import RESPONSE_CACHE_TTL
+
+ALGORITHMS_BY_DIGEST_LENGTH = {32: 'md5', 40: 'sha1', 56: 'sha224', 64: 'sha256', 96: 'sha384', 128: 'sha512'}
+GNU_LINE = re.compile(r'(?P<digest>[0-9a-fA-F]+) [ *](?P<filename>.+)')
+BSD_LINE = re.compile(r'(?P<algorithm>[\w-]+) ?\((?P<filename>.+)\) ?= ?(?P<digest>[0-9a-fA-F]+)')
+SIDECAR_LINE = re.compile(r'(?P<digest>[0-9a-fA-F]+)')
+
+
+class Entry(NamedTuple):
+    algorithm: Optional[str]
+    digest: str
+
+
+def parse(lines: Iterable[str]) -> dict[str, Entry]:
+    """Indexes a manifest by filename in a single pass, keeping the first entry for a repeated filename."""
+    index = {}
+    for line in lines:
+        line = line.strip()
+        match = GNU_LINE.fullmatch(line) or BSD_LINE.fullmatch(line) or SIDECAR_LINE.fullmatch(line)
+        if match is None:
+            continue
+        fields = match.groupdict()
+        digest = fields['digest'].lower()
+        algorithm = fields.get('algorithm')
+        algorithm = algorithm.replace('-', '').lower() if algorithm else ALGORITHMS_BY_DIGEST_LENGTH.get(len(digest))
+        index.setdefault(fields.get('filename', ''), Entry(algorithm, digest))
+    return index
+
+
+manifests = RunCache(ttl=RESPONSE_CACHE_TTL)
+
+
+def load(url: str) -> dict[str, Entry]:
+    return manifests.get(url, lambda: parse(get_raised(url).text.splitlines()))
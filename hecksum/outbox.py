@@ -0,0 +1,166 @@
+from contextlib import closing
+import threading
+import time
+from typing import Callable
+
+import requests
+
+from hecksum.cache import connect_sqlite
+from hecksum.db_models import Check
+from settings import OUTBOX_PATH
+
+MAX_BATCH_SIZE = 10
+# Responses that mean the check itself is bad. Anything else, such as an expired API key, may pass on retry.
+REJECTED_STATUSES = {400, 413, 422}
+# How long a batch stays claimed by the process sending it, longer than Airtable's rate limit retries take.
+LEASE_SECONDS = 600
+
+
+class Outbox:
+    """
+    A write-ahead queue of checks on disk. ``append`` only has to reach the local database; a background thread
+    then hands queued checks to ``write`` in batches, retrying failed batches with exponential backoff.
+    After ``split_after`` failed attempts, checks are sent one at a time so that a single bad check can't hold up
+    the rest; a check Airtable then rejects as invalid is moved to the ``dead_letters`` table, from where
+    ``requeue_dead_letters`` can put it back.
+    Checks still queued when the process exits are sent by the next Outbox opened on the same file. Each batch is
+    claimed before it is sent, so several processes can share the file without sending a check twice.
+    """
+
+    def __init__(
+        self,
+        write: Callable[[list[Check]], None],
+        path: str = OUTBOX_PATH,
+        batch_size: int = MAX_BATCH_SIZE,
+        max_backoff: float = 300,
+        poll_interval: float = 1,
+        split_after: int = 3,
+    ):
+        self.write = write
+        self.path = path
+        self.batch_size = batch_size
+        self.max_backoff = max_backoff
+        self.poll_interval = poll_interval
+        self.split_after = split_after
+        with closing(_connect(path)):
+            pass
+        self._drain_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closing = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='Outbox', daemon=True)
+        self._thread.start()
+
+    def append(self, checks: list[Check]) -> None:
+        with closing(connect_sqlite(self.path)) as connection, connection:
+            connection.executemany('INSERT INTO outbox ("check") VALUES (?)', [(check.json(),) for check in checks])
+        self._wakeup.set()
+
+    def pending(self) -> int:
+        with closing(connect_sqlite(self.path)) as connection:
+            return connection.execute('SELECT COUNT(*) FROM outbox').fetchone()[0]
+
+    def close(self) -> None:
+        """Stops the background thread and makes a final attempt to send everything still queued."""
+        self._closing.set()
+        self._wakeup.set()
+        self._thread.join()
+        self._drain(ignore_backoff=True)
+        pending = self.pending()
+        if pending:
+            print(f'{pending} checks left in the outbox at {self.path}, they will be sent on the next run')
+
+    def _run(self) -> None:
+        while not self._closing.is_set():
+            self._drain()
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    def _drain(self, ignore_backoff: bool = False) -> None:
+        with self._drain_lock:
+            while True:
+                rows = self._claim(ignore_backoff)
+                if not rows:
+                    return
+                try:
+                    self.write([Check.parse_raw(row[1]) for row in rows])
+                except Exception as e:
+                    if len(rows) == 1 and rows[0][2] >= self.split_after and _rejected(e):
+                        print(f'Check {rows[0][0]} was rejected, moving it to the outbox dead letters: {e}')
+                        self._bury(rows[0], e)
+                        continue
+                    print(f'Sending {len(rows)} checks from the outbox failed: {e}')
+                    with closing(connect_sqlite(self.path)) as connection, connection:
+                        connection.executemany(
+                            'UPDATE outbox SET attempts = attempts + 1, next_attempt = ?, leased_until = 0 '
+                            'WHERE id = ?',
+                            [(time.time() + min(self.max_backoff, 2 ** attempts), id_) for id_, _, attempts in rows],
+                        )
+                    return
+                with closing(connect_sqlite(self.path)) as connection, connection:
+                    connection.executemany('DELETE FROM outbox WHERE id = ?', [(row[0],) for row in rows])
+
+    def _claim(self, ignore_backoff: bool) -> list[tuple]:
+        """Leases the next batch that is due and not claimed by another process, and returns its rows."""
+        now = time.time()
+        with closing(connect_sqlite(self.path)) as connection:
+            connection.isolation_level = None
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                rows = connection.execute(
+                    'SELECT id, "check", attempts FROM outbox WHERE leased_until <= ? AND next_attempt <= ? '
+                    'ORDER BY id LIMIT ?',
+                    (now, float('inf') if ignore_backoff else now, self.batch_size),
+                ).fetchall()
+                if rows and rows[0][2] >= self.split_after:
+                    rows = rows[:1]
+                connection.executemany(
+                    'UPDATE outbox SET leased_until = ? WHERE id = ?', [(now + LEASE_SECONDS, row[0]) for row in rows]
+                )
+                connection.execute('COMMIT')
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+        return rows
+
+    def _bury(self, row: tuple, error: Exception) -> None:
+        id_, check, attempts = row
+        with closing(connect_sqlite(self.path)) as connection, connection:
+            connection.execute(
+                'INSERT INTO dead_letters ("check", attempts, error, failed_at) VALUES (?, ?, ?, ?)',
+                (check, attempts + 1, str(error), time.time()),
+            )
+            connection.execute('DELETE FROM outbox WHERE id = ?', (id_,))
+
+
+def requeue_dead_letters(path: str = OUTBOX_PATH) -> int:
+    """Moves every dead letter back into the outbox for a fresh round of attempts and returns how many there were."""
+    with closing(_connect(path)) as connection, connection:
+        count = connection.execute('INSERT INTO outbox ("check") SELECT "check" FROM dead_letters ORDER BY id').rowcount
+        connection.execute('DELETE FROM dead_letters')
+    return count
+
+
+def _connect(path: str):
+    connection = connect_sqlite(path)
+    with connection:
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS outbox ('
+            'id INTEGER PRIMARY KEY, "check" TEXT NOT NULL, '
+            'attempts INTEGER NOT NULL DEFAULT 0, next_attempt REAL NOT NULL DEFAULT 0, '
+            'leased_until REAL NOT NULL DEFAULT 0)'
+        )
+        if 'leased_until' not in {column[1] for column in connection.execute('PRAGMA table_info(outbox)')}:
+            connection.execute('ALTER TABLE outbox ADD COLUMN leased_until REAL NOT NULL DEFAULT 0')
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS dead_letters ('
+            'id INTEGER PRIMARY KEY, "check" TEXT NOT NULL, attempts INTEGER NOT NULL, error TEXT, '
+            'failed_at REAL NOT NULL)'
+        )
+    return connection
+
+
+def _rejected(e: Exception) -> bool:
+    # Retrying won't help a check that can't be parsed or that Airtable refuses as invalid.
+    if isinstance(e, requests.HTTPError) and e.response is not None:
+        return e.response.status_code in REJECTED_STATUSES
+    return isinstance(e, ValueError)
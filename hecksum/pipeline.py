@@ -0,0 +1,59 @@
+import queue
+import threading
+from typing import Callable, Generic, TypeVar
+
+T = TypeVar('T')
+
+_CLOSED = object()
+
+
+class BackgroundWriter(Generic[T]):
+    """
+    Hands items to ``write`` on a dedicated thread so slow sinks don't hold up the producer.
+    At most ``maxsize`` items wait in the queue; ``put`` blocks beyond that. ``close`` returns once the queue is drained.
+    With ``batch`` set, ``write`` receives a list of everything queued at the time instead of one item at a time.
+    """
+
+    def __init__(self, write: Callable, maxsize: int = 100, name: str = 'writer', batch: bool = False):
+        self.write = write
+        self.name = name
+        self.batch = batch
+        self._queue = queue.Queue(maxsize)
+        self._thread = threading.Thread(target=self._drain, name=name, daemon=True)
+        self._thread.start()
+
+    def put(self, item: T) -> None:
+        self._queue.put(item)
+
+    def close(self) -> None:
+        if self._thread.is_alive():
+            self._queue.put(_CLOSED)
+            self._thread.join()
+
+    def __enter__(self) -> 'BackgroundWriter[T]':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _drain(self) -> None:
+        while True:
+            items = [self._queue.get()]
+            while self.batch and not self._queue.empty():
+                items.append(self._queue.get_nowait())
+            closed = items[-1] is _CLOSED
+            if closed:
+                items.pop()
+            if not self.batch:
+                for item in items:
+                    self._write(item)
+            elif items:
+                self._write(items)
+            if closed:
+                return
+
+    def _write(self, item) -> None:
+        try:
+            self.write(item)
+        except Exception as e:
+            print(f'{self.name} failed to write {item}: {e}')
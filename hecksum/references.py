@@ -1,64 +1,179 @@
+from collections import defaultdict
 import hashlib
 import re
-from typing import cast, Optional
+from fnmatch import fnmatch
+from typing import cast, ClassVar, Iterable, Optional
+from urllib.parse import urljoin
 
-from pydantic import BaseModel, constr, HttpUrl
-import requests
+from pydantic import BaseModel, constr, HttpUrl, PrivateAttr
 
+from hecksum import manifests
+from hecksum.digest_cache import CachedDigests, digest_cache
+from hecksum.downloads import ByteBudget, hash_url, probe
 from hecksum.functions import get_raised
-from settings import IGNORED_EXCEPTIONS
+from hecksum.github import latest_release_tag
+from settings import (
+    DOWNLOAD_PARALLEL_SEGMENTS,
+    DOWNLOAD_PIPELINE_DEPTH,
+    DOWNLOAD_SEGMENT_SIZE,
+    IGNORED_EXCEPTIONS,
+)
 
 
 class BaseReference(BaseModel):
     algorithm: str
+    extra_algorithms: list[str] = []
     checksum_url: Optional[HttpUrl] = None
     download_url: Optional[HttpUrl] = None
     checksum: Optional[constr(strip_whitespace=True)] = None
 
 
 class Reference(BaseReference):
+    version: Optional[str] = None
+    download_size: Optional[int] = None
+    digest_cache_hit: Optional[bool] = None
+    _download: Optional[tuple[str, bytes]] = PrivateAttr(None)
+
     class Config:
         validate_assignment = True
 
-    def populated(self) -> bool:
-        return all(self.dict().values())
+    def attach_download(self, url: str, content: bytes) -> None:
+        """Hands over a body already fetched while populating, so verifying ``url`` hashes it instead of refetching."""
+        self._download = (url, content)
 
-    def get_download_checksum(self) -> str:
-        h = hashlib.new(self.algorithm)
-        r = requests.get(self.download_url, stream=True)
-        r.raise_for_status()
-        for chunk in r.iter_content(1024**2):
-            h.update(chunk)
-        checksum = h.hexdigest()
-        return checksum
+    @property
+    def algorithms(self) -> list[str]:
+        return [self.algorithm, *(a for a in self.extra_algorithms if a != self.algorithm)]
+
+    def populated(self) -> bool:
+        return all((self.algorithm, self.checksum_url, self.download_url, self.checksum))
+
+    def fingerprint(self) -> Optional[dict]:
+        """
+        Identifies the populated release and the artifact currently served for it,
+        or returns None when the server doesn't give the artifact any validators.
+        """
+        download = probe(self.download_url)
+        if not (download.etag or download.last_modified):
+            return None
+        return {
+            'version': self.version,
+            'checksum': self.checksum,
+            'checksum_url': str(self.checksum_url),
+            'download_url': str(self.download_url),
+            'etag': download.etag,
+            'last_modified': download.last_modified,
+            'size': download.size,
+        }
+
+    def get_download_checksum(self, **kwargs) -> str:
+        """Returns the digest for ``algorithm``; keyword arguments are passed on to ``get_download_checksums``."""
+        return self.get_download_checksums([self.algorithm], **kwargs)[self.algorithm]
+
+    def get_download_checksums(
+        self,
+        algorithms: Optional[Iterable[str]] = None,
+        pipeline_depth: int = DOWNLOAD_PIPELINE_DEPTH,
+        parallel_segments: int = DOWNLOAD_PARALLEL_SEGMENTS,
+        segment_size: int = DOWNLOAD_SEGMENT_SIZE,
+        use_cache: bool = True,
+        budget: Optional[ByteBudget] = None,
+    ) -> dict[str, str]:
+        algorithms = list(algorithms or self.algorithms)
+        if self._download and self._download[0] == self.download_url:
+            content = self._download[1]
+            self.download_size = len(content)
+            self.digest_cache_hit = False
+            return {algorithm: hashlib.new(algorithm, content).hexdigest() for algorithm in algorithms}
+        cache = digest_cache if use_cache else None
+        cached = cache.get(self.download_url) if cache else None
+        if cached and not set(algorithms) <= cached.digests.keys():
+            cached = None
+        hashes = {algorithm: hashlib.new(algorithm) for algorithm in algorithms}
+        download = hash_url(
+            self.download_url,
+            hashes.values(),
+            pipeline_depth=pipeline_depth,
+            parallel_segments=parallel_segments,
+            segment_size=segment_size,
+            etag=cached and cached.etag,
+            last_modified=cached and cached.last_modified,
+            size=cached and cached.size,
+            budget=budget,
+        )
+        self.download_size = download.size
+        self.digest_cache_hit = download.not_modified
+        if download.not_modified:
+            return {algorithm: cached.digests[algorithm] for algorithm in algorithms}
+        digests = {algorithm: h.hexdigest() for algorithm, h in hashes.items()}
+        if cache and (download.etag or download.last_modified):
+            cache.put(self.download_url, CachedDigests(download.etag, download.last_modified, download.size, digests))
+        return digests
 
 
 class ReferenceFactory(BaseReference):
+    speculative_download: ClassVar[bool] = True
+
     class Config:
         allow_mutation = False
 
     def make(self) -> Reference:
-        ref = Reference(**self.dict())
-        try:
-            self._populate(ref)
-        except IGNORED_EXCEPTIONS:
-            pass
-        return ref
+        return self.make_many([self])[0]
+
+    def make_all(self) -> list[Reference]:
+        """Returns a reference for every asset this factory can verify; most factories verify a single one."""
+        return [self.make()]
+
+    @classmethod
+    def make_many(cls, factories: Iterable['ReferenceFactory']) -> list[Reference]:
+        members = [(factory, Reference(**factory.dict())) for factory in factories]
+        families = defaultdict(list)
+        for factory, ref in members:
+            families[type(factory)].append((factory, ref))
+        for family, family_members in families.items():
+            try:
+                family._populate_many(family_members)
+            except IGNORED_EXCEPTIONS:
+                pass
+        return [ref for _, ref in members]
+
+    @classmethod
+    def _populate_many(cls, members: list[tuple['ReferenceFactory', Reference]]) -> None:
+        for factory, ref in members:
+            try:
+                factory._populate(ref)
+            except IGNORED_EXCEPTIONS:
+                pass
 
     def _populate(self, ref: Reference) -> None:
         ref.checksum = get_raised(ref.checksum_url).text
 
 
 class CodecovBashUploader(ReferenceFactory):
+    # Populating already downloads the script, see Reference.attach_download.
+    speculative_download: ClassVar[bool] = False
     algorithm = 'sha512'
     download_url: HttpUrl = 'https://codecov.io/bash'
 
-    def _populate(self, ref: Reference) -> None:
-        script = get_raised(ref.download_url).text
-        version = re.search(r'VERSION="(.*)"', script).group(1)
-        ref.checksum_url = f'https://raw.githubusercontent.com/codecov/codecov-bash/{version}/SHA512SUM'
-        checksum = get_raised(ref.checksum_url).text
-        ref.checksum = re.search(r'(.*) {2}codecov', checksum).group(1)
+    @classmethod
+    def _populate_many(cls, members: list[tuple['CodecovBashUploader', Reference]]) -> None:
+        releases_by_url = {}
+        for _, ref in members:
+            try:
+                if ref.download_url not in releases_by_url:
+                    releases_by_url[ref.download_url] = cls._resolve_release(ref.download_url)
+                ref.version, ref.checksum_url, ref.checksum, script = releases_by_url[ref.download_url]
+                ref.attach_download(ref.download_url, script)
+            except IGNORED_EXCEPTIONS:
+                pass
+
+    @staticmethod
+    def _resolve_release(download_url: str) -> tuple[str, str, str, bytes]:
+        # The script is the artifact under verification, so it must come from upstream rather than any cache.
+        script = get_raised(download_url, cache=False)
+        version = re.search(r'VERSION="(.*)"', script.text).group(1)
+        checksum_url = f'https://raw.githubusercontent.com/codecov/codecov-bash/{version}/SHA512SUM'
+        return version, checksum_url, manifests.load(checksum_url)['codecov'].digest, script.content
 
 
 class Transmission(ReferenceFactory):
@@ -68,35 +183,115 @@ class Transmission(ReferenceFactory):
     sha_key: str
     version_key: str
 
-    def _populate(self, ref: Reference) -> None:
-        constants = get_raised(ref.checksum_url).text
+    @classmethod
+    def _populate_many(cls, members: list[tuple['Transmission', Reference]]) -> None:
+        constants_by_url = {}
+        for factory, ref in members:
+            try:
+                if ref.checksum_url not in constants_by_url:
+                    constants_by_url[ref.checksum_url] = get_raised(ref.checksum_url).text
+                factory._populate_from_constants(ref, constants_by_url[ref.checksum_url])
+            except IGNORED_EXCEPTIONS:
+                pass
+
+    def _populate_from_constants(self, ref: Reference, constants: str) -> None:
         ref.checksum = re.search(f'{self.sha_key}: "(.*)"', constants).group(1)
         version = re.search(f'{self.version_key}: "(.*)"', constants).group(1)
+        ref.version = version
         file_name = self.file_name_template.format(version=version)
         ref.download_url = f'https://github.com/transmission/transmission-releases/raw/master/{file_name}'
 
+
+class ManifestReferenceFactory(ReferenceFactory):
+    """
+    Verifies the assets listed in the checksum manifest at ``checksum_url`` whose file names match the ``include``
+    glob and whose digests use ``algorithm``. Assets are downloaded relative to ``download_base_url``, which
+    defaults to the manifest's own directory. ``make`` populates the first such asset and ``make_all`` every one.
+    """
+    include: str = '*'
+    download_base_url: Optional[HttpUrl] = None
+
+    def make_all(self) -> list[Reference]:
+        try:
+            assets = self._assets()
+        except IGNORED_EXCEPTIONS:
+            return [Reference(**self.dict())]
+        return [self._reference(file_name, digest) for file_name, digest in assets] or [Reference(**self.dict())]
+
+    def _populate(self, ref: Reference) -> None:
+        file_name, digest = self._assets()[0]
+        ref.download_url = self._reference(file_name, digest).download_url
+        ref.checksum = digest
+
+    def _assets(self) -> list[tuple[str, str]]:
+        return [
+            (file_name, entry.digest)
+            for file_name, entry in manifests.load(self.checksum_url).items()
+            if fnmatch(file_name, self.include) and entry.algorithm == self.algorithm
+        ]
+
+    def _reference(self, file_name: str, digest: str) -> Reference:
+        return Reference(
+            **self.dict(exclude={'download_url', 'checksum'}),
+            download_url=urljoin(self.download_base_url or self.checksum_url, file_name),
+            checksum=digest,
+        )
+
+
 '''
    Doppler CLI releases on 23 architectures as of 04/29/2021, this reference takes in an architecture and attempts
    to verify the doppler CLI release for that architecture. Doppler also releases each architecture in multiple formats.
-   This reference does not handle the multiple formats, instead it picks the first packaging it finds and uses that
-   as the release to download and verify.
+   make() picks the first packaging it finds and uses that as the release to download and verify, while make_all()
+   returns a reference for every packaging of the architecture.
 '''
 class Doppler(ReferenceFactory):
     algorithm = 'sha256'
     architecture: str
 
-    # TODO: Doppler releases in multiple formats per architecture. This doesn't handle that and
-    # only retrieves the first file for a particular architecture. We should find a way to support
-    # all the releases in whichever format.
-    def _populate(self, ref: Reference) -> None:
-        latest_release_url = requests.get('https://github.com/DopplerHQ/cli/releases/latest').url
-        version = re.search(r'\d+\.\d+\.\d+', latest_release_url)[0]
-        ref.checksum_url = f'https://github.com/DopplerHQ/cli/releases/download/{version}/checksums.txt'
-        checksum = get_raised(ref.checksum_url).text
-        regex_string = fr'([\w\d]{{64}}) {{2}}(doppler_{version}_{self.architecture}\.[\w\.]+)'
-        release_chucksum = re.search(regex_string, checksum)
-        ref.checksum = release_chucksum.group(1)
-        release_file_name = release_chucksum.group(2)
+    @classmethod
+    def _populate_many(cls, members: list[tuple['Doppler', Reference]]) -> None:
+        version = cls._latest_version()
+        checksum_url = cls._checksum_url(version)
+        releases = cls._releases_by_architecture(version, manifests.load(checksum_url))
+        for factory, ref in members:
+            try:
+                ref.checksum_url = checksum_url
+                factory._populate_release(ref, version, releases)
+            except IGNORED_EXCEPTIONS:
+                pass
+
+    def make_all(self) -> list[Reference]:
+        try:
+            version = self._latest_version()
+        except IGNORED_EXCEPTIONS:
+            return [Reference(**self.dict())]
+        return ManifestReferenceFactory(
+            algorithm=self.algorithm,
+            checksum_url=self._checksum_url(version),
+            include=f'doppler_{version}_{self.architecture}.*',
+        ).make_all()
+
+    @staticmethod
+    def _latest_version() -> str:
+        return re.search(r'\d+\.\d+\.\d+', latest_release_tag('DopplerHQ/cli'))[0]
+
+    @staticmethod
+    def _checksum_url(version: str) -> str:
+        return f'https://github.com/DopplerHQ/cli/releases/download/{version}/checksums.txt'
+
+    @staticmethod
+    def _releases_by_architecture(version: str, manifest: dict[str, manifests.Entry]) -> dict[str, tuple[str, str]]:
+        releases = {}
+        prefix = f'doppler_{version}_'
+        for file_name, entry in manifest.items():
+            if file_name.startswith(prefix) and entry.algorithm == 'sha256':
+                architecture = file_name[len(prefix):].partition('.')[0]
+                releases.setdefault(architecture, (file_name, entry.digest))
+        return releases
+
+    def _populate_release(self, ref: Reference, version: str, releases: dict[str, tuple[str, str]]) -> None:
+        release_file_name, ref.checksum = releases[self.architecture]
+        ref.version = version
         ref.download_url = f'https://github.com/DopplerHQ/cli/releases/download/{version}/{release_file_name}'
 
 
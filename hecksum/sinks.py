@@ -0,0 +1,138 @@
+from abc import ABC, abstractmethod
+import os
+import threading
+from typing import Iterable, Optional
+
+from hecksum import airtable
+from hecksum.changes import ChangeDetector
+from hecksum.db_models import Check
+from hecksum.outbox import Outbox
+from hecksum.pipeline import BackgroundWriter
+from hecksum.store import CheckStore
+from settings import AIRTABLE_OUTBOX, NDJSON_PATH, STORE_PATH
+
+
+class Sink(ABC):
+    """A destination for check results. ``write`` receives checks in batches."""
+
+    @abstractmethod
+    def write(self, checks: list[Check]) -> None:
+        pass
+
+    def flush(self) -> None:
+        """Delivers everything written so far, raising if that fails. Sinks that don't buffer have nothing to do."""
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> 'Sink':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class AirtableSink(Sink):
+    """Writes checks to Airtable in batches. When ``durable``, checks go through the local outbox first."""
+
+    def __init__(
+        self,
+        upsert: bool = False,
+        bucket: airtable.TokenBucket = airtable.rate_limit,
+        durable: bool = AIRTABLE_OUTBOX,
+    ):
+        writer_class = airtable.UpsertCheckWriter if upsert else airtable.CheckWriter
+        self.writer = writer_class(bucket=bucket)
+        self.outbox = Outbox(self.writer.write) if durable else None
+
+    def write(self, checks: list[Check]) -> None:
+        if self.outbox:
+            self.outbox.append(checks)
+        else:
+            self.writer.add_many(checks)
+
+    def flush(self) -> None:
+        # Checks in the outbox are already safe on disk.
+        if not self.outbox:
+            self.writer.flush()
+
+    def close(self) -> None:
+        if self.outbox:
+            self.outbox.close()
+        self.writer.close()
+
+
+class SQLiteSink(Sink):
+    def __init__(self, path: str = STORE_PATH):
+        self.store = CheckStore(path)
+
+    def write(self, checks: list[Check]) -> None:
+        self.store.add_many(checks)
+
+
+class NDJSONSink(Sink):
+    def __init__(self, path: str = NDJSON_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def write(self, checks: list[Check]) -> None:
+        with self._lock, open(self.path, 'a') as f:
+            f.writelines(f'{check.json()}\n' for check in checks)
+
+
+class StdoutSink(Sink):
+    def write(self, checks: list[Check]) -> None:
+        for check in checks:
+            print(check)
+
+
+class ChangesOnly(Sink):
+    """Passes a check on to ``sink`` only when it differs from the last result emitted for its project and asset."""
+
+    def __init__(self, sink: Sink, detector: Optional[ChangeDetector] = None):
+        self.sink = sink
+        self.detector = detector or ChangeDetector()
+
+    def write(self, checks: list[Check]) -> None:
+        changed = self.detector.changed(checks)
+        if changed:
+            self.sink.write(changed)
+            # Only once the sink has delivered them, so a failed write is retried with the next result.
+            self.sink.flush()
+            self.detector.record(changed)
+
+    def close(self) -> None:
+        self.sink.close()
+
+
+class FanOut(Sink):
+    """
+    Writes every check to each of ``sinks`` from that sink's own background thread, so a slow sink
+    doesn't hold up the others or the caller until its queue of ``maxsize`` checks fills up.
+    """
+
+    def __init__(self, sinks: Iterable[Sink], maxsize: int = 1000):
+        self.sinks = list(sinks)
+        self._writers = [
+            BackgroundWriter(sink.write, maxsize=maxsize, name=type(sink).__name__, batch=True) for sink in self.sinks
+        ]
+
+    def write(self, checks: list[Check]) -> None:
+        for writer in self._writers:
+            for check in checks:
+                writer.put(check)
+
+    def close(self) -> None:
+        for writer in self._writers:
+            writer.close()
+        for sink in self.sinks:
+            sink.close()
+
+
+SINKS = {
+    'airtable': AirtableSink,
+    'sqlite': SQLiteSink,
+    'ndjson': NDJSONSink,
+    'stdout': StdoutSink,
+}
@@ -0,0 +1,146 @@
+from contextlib import closing
+from datetime import datetime, timezone
+import json
+from typing import Iterable, Optional
+
+from hecksum.cache import connect_sqlite
+from hecksum.db_models import Check, Project
+from settings import STORE_PATH
+
+COLUMNS = (
+    'project_id',
+    'project_name',
+    'status',
+    'checksum',
+    'checksum_url',
+    'download_url',
+    'digests',
+    'digest_cache_hit',
+    'checked_at',
+    'duration',
+    'download_size',
+    'cached',
+)
+
+
+class CheckStore:
+    """
+    A local SQLite history of every check, indexed for per-project and per-status queries over time.
+    Timestamps are stored as UNIX seconds.
+    """
+
+    def __init__(self, path: str = STORE_PATH):
+        self.path = path
+        with closing(self._connect()) as connection, connection:
+            connection.executescript(
+                '''
+                CREATE TABLE IF NOT EXISTS checks (
+                    id INTEGER PRIMARY KEY,
+                    project_id TEXT NOT NULL,
+                    project_name TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    checksum TEXT,
+                    checksum_url TEXT,
+                    download_url TEXT,
+                    digests TEXT,
+                    digest_cache_hit INTEGER,
+                    checked_at REAL NOT NULL,
+                    duration REAL,
+                    download_size INTEGER,
+                    cached INTEGER NOT NULL DEFAULT 0
+                );
+                CREATE INDEX IF NOT EXISTS checks_project_time ON checks (project_id, checked_at);
+                CREATE INDEX IF NOT EXISTS checks_asset_time ON checks (project_id, download_url, checked_at);
+                CREATE INDEX IF NOT EXISTS checks_status_time ON checks (status, checked_at);
+                '''
+            )
+            if 'cached' not in {column[1] for column in connection.execute('PRAGMA table_info(checks)')}:
+                connection.execute('ALTER TABLE checks ADD COLUMN cached INTEGER NOT NULL DEFAULT 0')
+
+    def add_many(self, checks: Iterable[Check]) -> None:
+        rows = [_row(check) for check in checks]
+        with closing(self._connect()) as connection, connection:
+            connection.executemany(
+                f'INSERT INTO checks ({", ".join(COLUMNS)}) VALUES ({", ".join("?" * len(COLUMNS))})', rows
+            )
+
+    def add(self, check: Check) -> None:
+        self.add_many([check])
+
+    def latest(self) -> list[Check]:
+        """The most recent check of every project and download URL, as --all-assets checks several per project."""
+        return self._query(
+            'SELECT {columns} FROM checks c WHERE checked_at = '
+            '(SELECT MAX(checked_at) FROM checks WHERE project_id = c.project_id AND download_url IS c.download_url) '
+            'ORDER BY project_id, download_url'
+        )
+
+    def transitions(self, project_id: Optional[str] = None, since: Optional[datetime] = None) -> list[Check]:
+        """Checks whose status differs from the previous check of the same project and download URL, oldest first."""
+        return self._query(
+            'SELECT {columns} FROM ('
+            'SELECT *, LAG(status) OVER (PARTITION BY project_id, download_url ORDER BY checked_at) AS previous_status '
+            'FROM checks '
+            'WHERE (:project_id IS NULL OR project_id = :project_id)'
+            ') WHERE previous_status IS NOT NULL AND previous_status != status '
+            'AND (:since IS NULL OR checked_at >= :since) ORDER BY checked_at',
+            project_id=project_id,
+            since=_timestamp(since),
+        )
+
+    def between(
+        self,
+        start: datetime,
+        end: datetime,
+        project_id: Optional[str] = None,
+        status: Optional[str] = None,
+    ) -> list[Check]:
+        return self._query(
+            'SELECT {columns} FROM checks WHERE checked_at >= :start AND checked_at < :end '
+            'AND (:project_id IS NULL OR project_id = :project_id) AND (:status IS NULL OR status = :status) '
+            'ORDER BY checked_at',
+            start=_timestamp(start),
+            end=_timestamp(end),
+            project_id=project_id,
+            status=status,
+        )
+
+    def _query(self, sql: str, **params) -> list[Check]:
+        with closing(self._connect()) as connection:
+            rows = connection.execute(sql.format(columns=', '.join(COLUMNS)), params).fetchall()
+        return [_check(row) for row in rows]
+
+    def _connect(self):
+        return connect_sqlite(self.path)
+
+
+def _timestamp(moment: Optional[datetime]) -> Optional[float]:
+    return moment.timestamp() if moment else None
+
+
+def _row(check: Check) -> tuple:
+    return (
+        check.project.airtable_id,
+        check.project.name,
+        check.status,
+        check.checksum,
+        check.checksum_url,
+        check.download_url,
+        json.dumps(check.digests) if check.digests is not None else None,
+        check.digest_cache_hit,
+        check.checked_at.timestamp(),
+        check.duration,
+        check.download_size,
+        check.cached,
+    )
+
+
+def _check(row: tuple) -> Check:
+    fields = dict(zip(COLUMNS, row))
+    digests = fields.pop('digests')
+    return Check(
+        project=Project(airtable_id=fields.pop('project_id'), name=fields.pop('project_name')),
+        digests=json.loads(digests) if digests is not None else None,
+        checked_at=datetime.fromtimestamp(fields.pop('checked_at'), timezone.utc),
+        **fields,
+    )
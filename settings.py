@@ -2,3 +2,29 @@ import os
 
 DEBUG = bool(os.environ.get('DEBUG', False))
 IGNORED_EXCEPTIONS = () if DEBUG else (Exception,)
+HTTP_TIMEOUT = float(os.environ.get('HTTP_TIMEOUT', 30))
+HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', 10))
+HTTP_PER_HOST_LIMIT = int(os.environ.get('HTTP_PER_HOST_LIMIT', 4))
+RESPONSE_CACHE_TTL = float(os.environ.get('RESPONSE_CACHE_TTL', 300))
+DOWNLOAD_PIPELINE_DEPTH = int(os.environ.get('DOWNLOAD_PIPELINE_DEPTH', 4))
+DOWNLOAD_PARALLEL_SEGMENTS = int(os.environ.get('DOWNLOAD_PARALLEL_SEGMENTS', 1))
+DOWNLOAD_SEGMENT_SIZE = int(os.environ.get('DOWNLOAD_SEGMENT_SIZE', 8 * 1024**2))
+CACHE_DIR = os.environ.get('CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'hecksum'))
+DIGEST_CACHE_SIZE = int(os.environ.get('DIGEST_CACHE_SIZE', 1000))
+DIGEST_CACHE_MAX_AGE_HOURS = float(os.environ.get('DIGEST_CACHE_MAX_AGE_HOURS', 24))
+HTTP_CACHE = bool(int(os.environ.get('HTTP_CACHE', 1)))
+HTTP_CACHE_STALE_WINDOW = float(os.environ.get('HTTP_CACHE_STALE_WINDOW', 0))
+AIRTABLE_RATE_LIMIT = float(os.environ.get('AIRTABLE_RATE_LIMIT', 5))
+AIRTABLE_RETENTION_SHARE = float(os.environ.get('AIRTABLE_RETENTION_SHARE', 0.4))
+AIRTABLE_LATEST_TABLE = os.environ.get('AIRTABLE_LATEST_TABLE', 'Latest')
+DATA_DIR = os.environ.get('DATA_DIR', os.path.join(os.path.expanduser('~'), '.local', 'share', 'hecksum'))
+STORE_PATH = os.environ.get('STORE_PATH', os.path.join(DATA_DIR, 'checks.sqlite3'))
+NDJSON_PATH = os.environ.get('NDJSON_PATH', os.path.join(DATA_DIR, 'checks.ndjson'))
+RESULT_SINKS = os.environ.get('RESULT_SINKS', 'airtable,sqlite,stdout').split(',')
+AIRTABLE_OUTBOX = bool(int(os.environ.get('AIRTABLE_OUTBOX', 1)))
+OUTBOX_PATH = os.environ.get('OUTBOX_PATH', os.path.join(DATA_DIR, 'outbox.sqlite3'))
+CHANGES_PATH = os.environ.get('CHANGES_PATH', os.path.join(DATA_DIR, 'changes.sqlite3'))
+HEARTBEAT_HOURS = float(os.environ.get('HEARTBEAT_HOURS', 12))
+FINGERPRINTS_PATH = os.environ.get('FINGERPRINTS_PATH', os.path.join(DATA_DIR, 'fingerprints.sqlite3'))
+REVERIFY_HOURS = float(os.environ.get('REVERIFY_HOURS', 24))
+AIRTABLE_CACHED_FIELD = os.environ.get('AIRTABLE_CACHED_FIELD', '')